@@ -42,6 +42,11 @@ class GitRefs(object):
     except KeyError:
       return ''
 
+  def invalidate(self):
+    """Forget the loaded refs, so the next access reads them again.
+    """
+    self._phyref = None
+
   def deleted(self, name):
     if self._phyref is not None:
       if name in self._phyref:
@@ -108,21 +113,16 @@ class GitRefs(object):
     except OSError:
       return
     try:
-      for line in fd:
-        line = str(line)
-        if line[0] == '#':
-          continue
-        if line[0] == '^':
-          continue
-
-        line = line[:-1]
-        p = line.split(' ')
-        ref_id = p[0]
-        name = p[1]
-
-        self._phyref[name] = ref_id
+      data = str(fd.read())
     finally:
       fd.close()
+
+    # Parse the whole file at once; large trees can pack thousands of refs.
+    for line in data.splitlines():
+      if not line or line[0] in '#^':
+        continue
+      ref_id, name = line.split(' ', 1)
+      self._phyref[name] = ref_id
     self._mtime['packed-refs'] = mtime
 
   def _ReadLoose(self, prefix):
@@ -68,6 +68,7 @@ class _Default(object):
   sync_j = 1
   sync_c = False
   sync_s = False
+  clone_depth = None
 
   def __eq__(self, other):
     return self.__dict__ == other.__dict__
@@ -243,6 +244,9 @@ class XmlManifest(object):
     if d.sync_s:
       have_default = True
       e.setAttribute('sync-s', 'true')
+    if d.clone_depth:
+      have_default = True
+      e.setAttribute('clone-depth', '%d' % d.clone_depth)
     if have_default:
       root.appendChild(e)
       root.appendChild(doc.createTextNode(''))
@@ -707,6 +711,16 @@ class XmlManifest(object):
       d.sync_s = False
     else:
       d.sync_s = sync_s.lower() in ("yes", "true", "1")
+
+    clone_depth = node.getAttribute('clone-depth')
+    if clone_depth:
+      try:
+        d.clone_depth = int(clone_depth)
+        if d.clone_depth <= 0:
+          raise ValueError()
+      except ValueError:
+        raise ManifestParseError('invalid clone-depth %s in %s' %
+                                 (clone_depth, self.manifestFile))
     return d
 
   def _ParseNotice(self, node):
@@ -810,6 +824,8 @@ class XmlManifest(object):
       except ValueError:
         raise ManifestParseError('invalid clone-depth %s in %s' %
                                  (clone_depth, self.manifestFile))
+    else:
+      clone_depth = self._default.clone_depth
 
     dest_branch = node.getAttribute('dest-branch') or self._default.destBranchExpr
 
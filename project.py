@@ -17,6 +17,7 @@ from __future__ import print_function
 import errno
 import filecmp
 import glob
+import heapq
 import os
 import random
 import re
@@ -53,6 +54,9 @@ else:
   input = raw_input
   # pylint:enable=W0622
 
+SUBMODULE_PATH_RE = re.compile(r'^submodule\.([^.]+)\.path=(.*)$')
+SUBMODULE_URL_RE = re.compile(r'^submodule\.([^.]+)\.url=(.*)$')
+
 
 def _lwrite(path, content):
   lock = '%s.lock' % path
@@ -72,12 +76,12 @@ def _lwrite(path, content):
 
 def _error(fmt, *args):
   msg = fmt % args
-  print('error: %s' % msg, file=sys.stderr)
+  sys.stderr.write('error: %s\n' % msg)
 
 
 def _warn(fmt, *args):
   msg = fmt % args
-  print('warn: %s' % msg, file=sys.stderr)
+  sys.stderr.write('warn: %s\n' % msg)
 
 
 def not_rev(r):
@@ -241,6 +245,80 @@ class _Annotation(object):
     self.keep = keep
 
 
+class _DiffInfo(object):
+  """One entry of `git diff-* -z` raw output, as parsed by DiffZ."""
+
+  def __init__(self, path, omode, nmode, oid, nid, state):
+    self.path = path
+    self.src_path = None
+    self.old_mode = omode
+    self.new_mode = nmode
+    self.old_id = oid
+    self.new_id = nid
+
+    if len(state) == 1:
+      self.status = state
+      self.level = None
+    else:
+      self.status = state[:1]
+      self.level = state[1:].lstrip('0')
+
+
+def _ParseStatusPorcelain(out, untracked=True):
+  """Split `git status --porcelain=v2 -z` output into (di, df, do).
+
+  di and df hold _DiffInfo records keyed by path, as DiffZ returns them for
+  diff-index -M --cached HEAD and diff-files; do lists the untracked paths
+  (None unless |untracked| is set).
+  """
+  zero = '0' * 40
+  di = {}
+  df = {}
+  do = [] if untracked else None
+  parts = out.split('\0')  # pylint: disable=W1401
+  i = 0
+  while i < len(parts):
+    rec = parts[i]
+    i += 1
+    kind = rec[:1]
+    if kind == '?':
+      if do is not None:
+        do.append(rec[2:])
+      continue
+    if kind == '1':
+      _, xy, _, mh, mi, mw, hh, hi, path = rec.split(' ', 8)
+      state = xy[0]
+      src_path = None
+    elif kind == '2':
+      _, xy, _, mh, mi, mw, hh, hi, state, path = rec.split(' ', 9)
+      src_path = parts[i]
+      i += 1
+    elif kind == 'u':
+      # diff-index reports a conflict against HEAD ("ours", stage 2).
+      # diff-files reports it as U, and its last word on the path is
+      # stage 2 against the work tree when that stage exists.
+      _, _, _, _, m2, _, mw, _, h2, _, path = rec.split(' ', 10)
+      di[path] = _DiffInfo(path, m2, '000000', h2, zero, 'U')
+      if m2 == '000000':
+        df[path] = _DiffInfo(path, '000000', mw, zero, zero, 'U')
+      elif mw == '000000':
+        df[path] = _DiffInfo(path, m2, mw, h2, zero, 'D')
+      else:
+        df[path] = _DiffInfo(path, m2, mw, h2, zero, 'M')
+      continue
+    else:
+      continue
+
+    if xy[0] != '.':
+      info = _DiffInfo(path, mh, mi, hh, hi, state)
+      if info.status in ('R', 'C'):
+        info.src_path = src_path
+      di[path] = info
+    if xy[1] != '.':
+      df[path] = _DiffInfo(path, mi, mw, hi, zero, xy[1])
+  return di, df, do
+
+
 class _CopyFile(object):
 
   def __init__(self, src, dest, abssrc, absdest):
@@ -740,6 +818,7 @@ class Project(object):
       self.work_git = None
     self.bare_git = self._GitGetByExec(self, bare=True, gitdir=gitdir)
     self.bare_ref = GitRefs(gitdir)
+    self._allrefs_cache = None
     self.bare_objdir = self._GitGetByExec(self, bare=True, gitdir=objdir)
     self.dest_branch = dest_branch
     self.old_revision = old_revision
@@ -777,6 +856,9 @@ class Project(object):
   def IsDirty(self, consider_untracked=True):
     """Is the working directory modified in some way?
     """
+    if git_require((2, 11, 0)):
+      # One `git status` scan, even when the tree is clean.
+      return any(self.work_git.StatusPorcelain(untracked=consider_untracked))
     self.work_git.update_index('-q',
                                '--unmerged',
                                '--ignore-missing',
@@ -789,6 +871,21 @@ class Project(object):
       return True
     return False
 
+  def _ComputeStatus(self):
+    """Get the (index, work tree, untracked) changes of the work tree.
+    """
+    if git_require((2, 11, 0)):
+      # A single `git status` refreshes the index and reports all three.
+      return self.work_git.StatusPorcelain()
+    self.work_git.update_index('-q',
+                               '--unmerged',
+                               '--ignore-missing',
+                               '--refresh')
+    di = self.work_git.DiffZ('diff-index', '-M', '--cached', HEAD)
+    df = self.work_git.DiffZ('diff-files')
+    do = self.work_git.LsOthers()
+    return di, df, do
+
   _userident_name = None
   _userident_email = None
 
@@ -810,22 +907,28 @@ class Project(object):
     return self._userident_email
 
   def _LoadUserIdentity(self):
+    # The ident is always "NAME <EMAIL> TIMESTAMP", so slice it apart.
     u = self.bare_git.var('GIT_COMMITTER_IDENT')
-    m = re.compile("^(.*) <([^>]*)> ").match(u)
-    if m:
-      self._userident_name = m.group(1)
-      self._userident_email = m.group(2)
+    lt = u.rfind(' <')
+    gt = u.find('> ', lt)
+    if lt >= 0 and gt > lt:
+      self._userident_name = u[:lt]
+      self._userident_email = u[lt + 2:gt]
     else:
       self._userident_name = ''
       self._userident_email = ''
 
   def GetRemote(self, name):
     """Get the configuration for a single remote.
+
+    The config keeps one object per name, so repeated lookups are cheap.
     """
     return self.config.GetRemote(name)
 
   def GetBranch(self, name):
     """Get the configuration for a single branch.
+
+    The config keeps one object per name, so repeated lookups are cheap.
     """
     return self.config.GetBranch(name)
 
@@ -938,19 +1041,12 @@ class Project(object):
     if not os.path.isdir(self.worktree):
       if output_redir is None:
         output_redir = sys.stdout
-      print(file=output_redir)
-      print('project %s/' % self.relpath, file=output_redir)
-      print('  missing (run "repo sync")', file=output_redir)
+      output_redir.write('\nproject %s/\n  missing (run "repo sync")\n'
+                         % self.relpath)
       return
 
-    self.work_git.update_index('-q',
-                               '--unmerged',
-                               '--ignore-missing',
-                               '--refresh')
     rb = self.IsRebaseInProgress()
-    di = self.work_git.DiffZ('diff-index', '-M', '--cached', HEAD)
-    df = self.work_git.DiffZ('diff-files')
-    do = self.work_git.LsOthers()
+    di, df, do = self._ComputeStatus()
     if not rb and not di and not df and not do and not self.CurrentBranch:
       return 'CLEAN'
 
@@ -974,12 +1070,14 @@ class Project(object):
       out.important('prior sync failed; rebase still in progress')
       out.nl()
 
-    paths = list()
-    paths.extend(di.keys())
-    paths.extend(df.keys())
-    paths.extend(do)
-
-    for p in sorted(set(paths)):
+    # git status / ls-files both list untracked paths in sorted order, which
+    # heapq.merge relies on; only the (usually much shorter) diff results
+    # need sorting before the merge.
+    prev = None
+    for p in heapq.merge(sorted(di), sorted(df), do):
+      if p == prev:
+        continue
+      prev = p
       try:
         i = di[p]
       except KeyError:
@@ -1052,17 +1150,9 @@ class Project(object):
        If so, returns the SHA-1 hash of the last published
        state for the branch.
     """
-    key = R_PUB + branch
     if all_refs is None:
-      try:
-        return self.bare_git.rev_parse(key)
-      except GitError:
-        return None
-    else:
-      try:
-        return all_refs[key]
-      except KeyError:
-        return None
+      all_refs = self._allrefs
+    return all_refs.get(R_PUB + branch)
 
   def CleanPublishedCache(self, all_refs=None):
     """Prunes any stale published refs.
@@ -1111,7 +1201,7 @@ class Project(object):
     """
     branch = self.GetBranch(branch_name)
     base = branch.LocalMerge
-    if branch.LocalMerge:
+    if base:
       rb = ReviewableBranch(self, branch, base)
       if rb.commits:
         return rb
@@ -1446,7 +1536,7 @@ class Project(object):
       return self.GetRevisionId(self._allrefs)
 
     try:
-      return self.bare_git.rev_list(self.revisionExpr, '-1')[0]
+      return self.bare_git.rev_list('-1', self.revisionExpr, '--')[0]
     except GitError:
       raise ManifestInvalidRevisionError('revision %s in %s not found' %
                                          (self.revisionExpr, self.name))
@@ -1550,10 +1640,22 @@ class Project(object):
       self._CopyAndLinkFiles()
       return
 
-    upstream_gain = self._revlist(not_rev(HEAD), revid)
+    # Walk HEAD...revid once: commits marked '<' are only reachable from
+    # HEAD (local changes), those marked '>' only from revid (upstream gain).
+    upstream_gain = []
+    local_changes = []
+    for commit in self._revlist('--left-right', '%s...%s' % (HEAD, revid),
+                                format='%m%H %ce'):
+      commit = commit.decode('utf-8')
+      if commit.startswith('<'):
+        local_changes.append(commit[1:])
+      elif commit.startswith('>'):
+        upstream_gain.append(commit[1:])
+
     pub = self.WasPublished(branch.name, all_refs)
     if pub:
-      not_merged = self._revlist(not_rev(revid), pub)
+      # Only whether anything is unmerged matters; stop at the first commit.
+      not_merged = self._revlist('--max-count=1', not_rev(revid), pub)
       if not_merged:
         if upstream_gain:
           # The user has published this branch and some of those
@@ -1576,11 +1678,10 @@ class Project(object):
     # Examine the local commits not in the remote.  Find the
     # last one attributed to this user, if any.
     #
-    local_changes = self._revlist(not_rev(revid), HEAD, format='%H %ce')
     last_mine = None
     cnt_mine = 0
     for commit in local_changes:
-      commit_id, committer_email = commit.decode('utf-8').split(' ', 1)
+      commit_id, committer_email = commit.split(' ', 1)
       if committer_email == self.UserEmail:
         last_mine = commit_id
         cnt_mine += 1
@@ -1691,10 +1792,12 @@ class Project(object):
 
     all_refs = self.bare_ref.all
     if R_HEADS + name in all_refs:
-      return GitCommand(self,
-                        ['checkout', name, '--'],
-                        capture_stdout=True,
-                        capture_stderr=True).Wait() == 0
+      ok = GitCommand(self,
+                      ['checkout', name, '--'],
+                      capture_stdout=True,
+                      capture_stderr=True).Wait() == 0
+      self._InvalidateRefs()
+      return ok
 
     branch = self.GetBranch(name)
     branch.remote = self.GetRemote(self.remote.name)
@@ -1714,16 +1817,21 @@ class Project(object):
         os.makedirs(os.path.dirname(ref))
       except OSError:
         pass
-      _lwrite(ref, '%s\n' % revid)
-      _lwrite(os.path.join(self.worktree, '.git', HEAD),
-              'ref: %s%s\n' % (R_HEADS, name))
+      try:
+        _lwrite(ref, '%s\n' % revid)
+        _lwrite(os.path.join(self.worktree, '.git', HEAD),
+                'ref: %s%s\n' % (R_HEADS, name))
+      finally:
+        self._InvalidateRefs()
       branch.Save()
       return True
 
-    if GitCommand(self,
-                  ['checkout', '-b', branch.name, revid],
-                  capture_stdout=True,
-                  capture_stderr=True).Wait() == 0:
+    ok = GitCommand(self,
+                    ['checkout', '-b', branch.name, revid],
+                    capture_stdout=True,
+                    capture_stderr=True).Wait() == 0
+    self._InvalidateRefs()
+    if ok:
       branch.Save()
       return True
     return False
@@ -1763,14 +1871,19 @@ class Project(object):
       # Same revision; just update HEAD to point to the new
       # target branch, but otherwise take no other action.
       #
-      _lwrite(os.path.join(self.worktree, '.git', HEAD),
-              'ref: %s%s\n' % (R_HEADS, name))
+      try:
+        _lwrite(os.path.join(self.worktree, '.git', HEAD),
+                'ref: %s%s\n' % (R_HEADS, name))
+      finally:
+        self._InvalidateRefs()
       return True
 
-    return GitCommand(self,
-                      ['checkout', name, '--'],
-                      capture_stdout=True,
-                      capture_stderr=True).Wait() == 0
+    ok = GitCommand(self,
+                    ['checkout', name, '--'],
+                    capture_stdout=True,
+                    capture_stderr=True).Wait() == 0
+    self._InvalidateRefs()
+    return ok
 
   def AbandonBranch(self, name):
     """Destroy a local topic branch.
@@ -1802,10 +1915,12 @@ class Project(object):
       else:
         self._Checkout(revid, quiet=True)
 
-    return GitCommand(self,
-                      ['branch', '-D', name],
-                      capture_stdout=True,
-                      capture_stderr=True).Wait() == 0
+    ok = GitCommand(self,
+                    ['branch', '-D', name],
+                    capture_stdout=True,
+                    capture_stderr=True).Wait() == 0
+    self._InvalidateRefs()
+    return ok
 
   def PruneHeads(self):
     """Prune any topic branches already merged into upstream.
@@ -1838,6 +1953,7 @@ class Project(object):
                        capture_stdout=True,
                        capture_stderr=True)
         b.Wait()
+        self._InvalidateRefs()
       finally:
         if ID_RE.match(old):
           self.bare_git.DetachHead(old)
@@ -1902,9 +2018,6 @@ class Project(object):
         submodules.append((sub_rev, sub_path, sub_url))
       return submodules
 
-    re_path = re.compile(r'^submodule\.([^.]+)\.path=(.*)$')
-    re_url = re.compile(r'^submodule\.([^.]+)\.url=(.*)$')
-
     def parse_gitmodules(gitdir, rev):
       cmd = ['cat-file', 'blob', '%s:.gitmodules' % rev]
       try:
@@ -1937,12 +2050,12 @@ class Project(object):
       for line in gitmodules_lines:
         if not line:
           continue
-        m = re_path.match(line)
+        m = SUBMODULE_PATH_RE.match(line)
         if m:
           names.add(m.group(1))
           paths[m.group(1)] = m.group(2)
           continue
-        m = re_url.match(line)
+        m = SUBMODULE_URL_RE.match(line)
         if m:
           names.add(m.group(1))
           urls[m.group(1)] = m.group(2)
@@ -2223,6 +2336,7 @@ class Project(object):
         else:
           platform_utils.remove(packed_refs)
       self.bare_git.pack_refs('--all', '--prune')
+    self._InvalidateRefs()
 
     if is_sha1 and current_branch_only:
       # We just synced the upstream given branch; verify we
@@ -2282,6 +2396,7 @@ class Project(object):
     cmd.append('refs/tags/*:refs/tags/*')
 
     ok = GitCommand(self, cmd, bare=True).Wait() == 0
+    self._InvalidateRefs()
     if os.path.exists(bundle_dst):
       platform_utils.remove(bundle_dst)
     if os.path.exists(bundle_tmp):
@@ -2357,7 +2472,9 @@ class Project(object):
       cmd.append('-q')
     cmd.append(rev)
     cmd.append('--')
-    if GitCommand(self, cmd).Wait() != 0:
+    rc = GitCommand(self, cmd).Wait()
+    self._InvalidateRefs()
+    if rc != 0:
       if self._allrefs:
         raise GitError('%s checkout %s ' % (self.name, rev))
 
@@ -2365,7 +2482,9 @@ class Project(object):
     cmd = ['cherry-pick']
     cmd.append(rev)
     cmd.append('--')
-    if GitCommand(self, cmd).Wait() != 0:
+    rc = GitCommand(self, cmd).Wait()
+    self._InvalidateRefs()
+    if rc != 0:
       if self._allrefs:
         raise GitError('%s cherry-pick %s ' % (self.name, rev))
 
@@ -2374,7 +2493,9 @@ class Project(object):
     cmd.append('--no-edit')
     cmd.append(rev)
     cmd.append('--')
-    if GitCommand(self, cmd).Wait() != 0:
+    rc = GitCommand(self, cmd).Wait()
+    self._InvalidateRefs()
+    if rc != 0:
       if self._allrefs:
         raise GitError('%s revert %s ' % (self.name, rev))
 
@@ -2383,7 +2504,9 @@ class Project(object):
     if quiet:
       cmd.append('-q')
     cmd.append(rev)
-    if GitCommand(self, cmd).Wait() != 0:
+    rc = GitCommand(self, cmd).Wait()
+    self._InvalidateRefs()
+    if rc != 0:
       raise GitError('%s reset --hard %s ' % (self.name, rev))
 
   def _SyncSubmodules(self, quiet=True):
@@ -2398,14 +2521,18 @@ class Project(object):
     if onto is not None:
       cmd.extend(['--onto', onto])
     cmd.append(upstream)
-    if GitCommand(self, cmd).Wait() != 0:
+    rc = GitCommand(self, cmd).Wait()
+    self._InvalidateRefs()
+    if rc != 0:
       raise GitError('%s rebase %s ' % (self.name, upstream))
 
   def _FastForward(self, head, ffonly=False):
     cmd = ['merge', head]
     if ffonly:
       cmd.append("--ff-only")
-    if GitCommand(self, cmd).Wait() != 0:
+    rc = GitCommand(self, cmd).Wait()
+    self._InvalidateRefs()
+    if rc != 0:
       raise GitError('%s merge %s ' % (self.name, head))
 
   def _InitGitDir(self, mirror_git=None, force_sync=False):
@@ -2513,8 +2640,7 @@ class Project(object):
                 self.relpath, name)
           continue
       try:
-        platform_utils.symlink(
-            os.path.relpath(stock_hook, os.path.dirname(dst)), dst)
+        platform_utils.symlink(os.path.relpath(stock_hook, hooks), dst)
       except OSError as e:
         if e.errno == errno.EPERM:
           raise GitError(self._get_symlink_error_message())
@@ -2556,6 +2682,7 @@ class Project(object):
       if cur != dst:
         msg = 'manifest set to %s' % self.revisionExpr
         self.bare_git.symbolic_ref('-m', msg, ref, dst)
+        self._InvalidateRefs()
 
   def _CheckDirReference(self, srcdir, destdir, share_refs):
     symlink_files = self.shareable_files[:]
@@ -2588,33 +2715,34 @@ class Project(object):
       copy_all: If true, copy all remaining files from |gitdir| -> |dotgit|.
           This saves you the effort of initializing |dotgit| yourself.
     """
-    symlink_files = self.shareable_files[:]
-    symlink_dirs = self.shareable_dirs[:]
+    symlink_files = set(self.shareable_files)
+    symlink_dirs = set(self.shareable_dirs)
     if share_refs:
-      symlink_files += self.working_tree_files
-      symlink_dirs += self.working_tree_dirs
-    to_symlink = symlink_files + symlink_dirs
+      symlink_files.update(self.working_tree_files)
+      symlink_dirs.update(self.working_tree_dirs)
+    to_symlink = symlink_files | symlink_dirs
 
     to_copy = []
     if copy_all:
       to_copy = os.listdir(gitdir)
 
     dotgit = platform_utils.realpath(dotgit)
-    for name in set(to_copy).union(to_symlink):
+    for name in to_symlink.union(to_copy):
       try:
-        src = platform_utils.realpath(os.path.join(gitdir, name))
         dst = os.path.join(dotgit, name)
-
+        # Check the destination before resolving the source, so entries
+        # which are already in place cost a single lstat.
         if os.path.lexists(dst):
           continue
 
+        src = platform_utils.realpath(os.path.join(gitdir, name))
+
         # If the source dir doesn't exist, create an empty dir.
         if name in symlink_dirs and not os.path.lexists(src):
           os.makedirs(src)
 
         if name in to_symlink:
-          platform_utils.symlink(
-              os.path.relpath(src, os.path.dirname(dst)), dst)
+          platform_utils.symlink(os.path.relpath(src, dotgit), dst)
         elif copy_all and not platform_utils.islink(dst):
           if os.path.isdir(src):
             shutil.copytree(src, dst)
@@ -2656,7 +2784,10 @@ class Project(object):
         raise e
 
       if init_dotgit:
-        _lwrite(os.path.join(dotgit, HEAD), '%s\n' % self.GetRevisionId())
+        # Resolve through the refs already on disk rather than rev-parse;
+        # GetCommitRevisionId still peels tags to their commit.
+        _lwrite(os.path.join(dotgit, HEAD),
+                '%s\n' % self.GetCommitRevisionId())
 
         cmd = ['read-tree', '--reset', '-u']
         cmd.append('-v')
@@ -2684,14 +2815,20 @@ class Project(object):
     return platform_utils.realpath(os.path.join(self.gitdir, path))
 
   def _revlist(self, *args, **kw):
-    a = []
-    a.extend(args)
-    a.append('--')
-    return self.work_git.rev_list(*a, **kw)
+    return self.work_git.rev_list(*(args + ('--',)), **kw)
 
   @property
   def _allrefs(self):
-    return self.bare_ref.all
+    if self._allrefs_cache is None:
+      self._allrefs_cache = self.bare_ref.all
+    return self._allrefs_cache
+
+  def _InvalidateRefs(self):
+    """Forget the memoized _allrefs; call after anything that moves refs.
+    """
+    self._allrefs_cache = None
+    # The mtime scan in GitRefs cannot see newly created loose refs.
+    self.bare_ref.invalidate()
 
   def _getLogs(self, rev1, rev2, oneline=False, color=True, pretty_format=None):
     """Get logs between two revisions of this project."""
@@ -2759,6 +2896,28 @@ class Project(object):
           return out[:-1].split('\0')  # pylint: disable=W1401
       return []
 
+    def StatusPorcelain(self, untracked=True):
+      """Collect the work tree status with one `git status --porcelain=v2`.
+
+      Returns (di, df, do) shaped like DiffZ('diff-index', '-M', '--cached',
+      HEAD), DiffZ('diff-files') and LsOthers(); do is None unless
+      |untracked| is set.  Requires git 2.11 or later.
+      """
+      cmd = ['status', '--porcelain=v2', '-z']
+      if untracked:
+        cmd.append('--untracked-files=all')
+      else:
+        cmd.append('--untracked-files=no')
+      p = GitCommand(self._project,
+                     cmd,
+                     gitdir=self._gitdir,
+                     bare=False,
+                     capture_stdout=True,
+                     capture_stderr=True)
+      if p.Wait() != 0:
+        raise GitError('%s status: %s' % (self._project.name, p.stderr))
+      return _ParseStatusPorcelain(p.stdout, untracked)
+
     def DiffZ(self, name, *args):
       cmd = [name]
       cmd.append('-z')
@@ -2773,38 +2932,18 @@ class Project(object):
         out = p.process.stdout.read()
         r = {}
         if out:
-          out = iter(out[:-1].split('\0'))  # pylint: disable=W1401
-          while out:
-            try:
-              info = next(out)
-              path = next(out)
-            except StopIteration:
-              break
-
-            class _Info(object):
-
-              def __init__(self, path, omode, nmode, oid, nid, state):
-                self.path = path
-                self.src_path = None
-                self.old_mode = omode
-                self.new_mode = nmode
-                self.old_id = oid
-                self.new_id = nid
-
-                if len(state) == 1:
-                  self.status = state
-                  self.level = None
-                else:
-                  self.status = state[:1]
-                  self.level = state[1:]
-                  while self.level.startswith('0'):
-                    self.level = self.level[1:]
-
-            info = info[1:].split(' ')
-            info = _Info(path, *info)
+          parts = out[:-1].split('\0')  # pylint: disable=W1401
+          i = 0
+          n = len(parts) - 1
+          while i < n:
+            info = _DiffInfo(parts[i + 1], *parts[i][1:].split(' '))
+            i += 2
             if info.status in ('R', 'C'):
+              if i >= len(parts):
+                break
               info.src_path = info.path
-              info.path = next(out)
+              info.path = parts[i]
+              i += 1
             r[info.path] = info
         return r
       finally:
@@ -2838,6 +2977,7 @@ class Project(object):
       cmdv.append(HEAD)
       cmdv.append(ref)
       self.symbolic_ref(*cmdv)
+      self._project._InvalidateRefs()
 
     def DetachHead(self, new, message=None):
       cmdv = ['--no-deref']
@@ -2846,6 +2986,7 @@ class Project(object):
       cmdv.append(HEAD)
       cmdv.append(new)
       self.update_ref(*cmdv)
+      self._project._InvalidateRefs()
 
     def UpdateRef(self, name, new, old=None,
                   message=None,
@@ -2860,12 +3001,14 @@ class Project(object):
       if old is not None:
         cmdv.append(old)
       self.update_ref(*cmdv)
+      self._project._InvalidateRefs()
 
     def DeleteRef(self, name, old=None):
       if not old:
         old = self.rev_parse(name)
       self.update_ref('-d', name, old)
       self._project.bare_ref.deleted(name)
+      self._project._InvalidateRefs()
 
     def rev_list(self, *args, **kw):
       if 'format' in kw:
@@ -2879,27 +3022,92 @@ class Project(object):
                      gitdir=self._gitdir,
                      capture_stdout=True,
                      capture_stderr=True)
-      r = []
-      for line in p.process.stdout:
-        if line[-1] == '\n':
-          line = line[:-1]
-        r.append(line)
+      r = p.process.stdout.read().splitlines()
       if p.Wait() != 0:
         raise GitError('%s rev-list %s: %s' %
                        (self._project.name, str(args), p.stderr))
       return r
 
+    def _spawn(self, name, *args, **kwargs):
+      """Run `git <name> <args>` and return its output.
+
+      The following keyword arguments are supported:
+        config: An optional dict of git config options to be passed with '-c'.
+
+      Args:
+        name: The git command to run, e.g. 'rev-parse'.
+
+      Returns:
+        The captured stdout, minus the trailing newline if it is a single line.
+      """
+      cmdv = []
+      config = kwargs.pop('config', None)
+      for k in kwargs:
+        raise TypeError('%s() got an unexpected keyword argument %r'
+                        % (name, k))
+      if config is not None:
+        if not git_require((1, 7, 2)):
+          raise ValueError('cannot set config on command line for %s()'
+                           % name)
+        for k, v in config.items():
+          cmdv.append('-c')
+          cmdv.append('%s=%s' % (k, v))
+      cmdv.append(name)
+      cmdv.extend(args)
+      p = GitCommand(self._project,
+                     cmdv,
+                     bare=self._bare,
+                     gitdir=self._gitdir,
+                     capture_stdout=True,
+                     capture_stderr=True)
+      if p.Wait() != 0:
+        raise GitError('%s %s: %s' %
+                       (self._project.name, name, p.stderr))
+      r = p.stdout
+      try:
+        r = r.decode('utf-8')
+      except AttributeError:
+        pass
+      if r.endswith('\n') and r.index('\n') == len(r) - 1:
+        return r[:-1]
+      return r
+
+    # The commands used on the sync and upload paths are bound directly so
+    # they don't go through __getattr__ on every call.
+    def init(self, *args, **kwargs):
+      return self._spawn('init', *args, **kwargs)
+
+    def log(self, *args, **kwargs):
+      return self._spawn('log', *args, **kwargs)
+
+    def pack_refs(self, *args, **kwargs):
+      return self._spawn('pack-refs', *args, **kwargs)
+
+    def rev_parse(self, *args, **kwargs):
+      return self._spawn('rev-parse', *args, **kwargs)
+
+    def symbolic_ref(self, *args, **kwargs):
+      return self._spawn('symbolic-ref', *args, **kwargs)
+
+    def update_index(self, *args, **kwargs):
+      return self._spawn('update-index', *args, **kwargs)
+
+    def update_ref(self, *args, **kwargs):
+      return self._spawn('update-ref', *args, **kwargs)
+
+    def var(self, *args, **kwargs):
+      return self._spawn('var', *args, **kwargs)
+
     def __getattr__(self, name):
       """Allow arbitrary git commands using pythonic syntax.
 
       This allows you to do things like:
-        git_obj.rev_parse('HEAD')
+        git_obj.ls_remote('origin')
 
-      Since we don't have a 'rev_parse' method defined, the __getattr__ will
+      Since we don't have a 'ls_remote' method defined, the __getattr__ will
       run.  We'll replace the '_' with a '-' and try to run a git command.
       Any other positional arguments will be passed to the git command, and the
-      following keyword arguments are supported:
-        config: An optional dict of git config options to be passed with '-c'.
+      keyword arguments documented in _spawn are supported.
 
       Args:
         name: The name of the git command to call.  Any '_' characters will
@@ -2911,37 +3119,7 @@ class Project(object):
       name = name.replace('_', '-')
 
       def runner(*args, **kwargs):
-        cmdv = []
-        config = kwargs.pop('config', None)
-        for k in kwargs:
-          raise TypeError('%s() got an unexpected keyword argument %r'
-                          % (name, k))
-        if config is not None:
-          if not git_require((1, 7, 2)):
-            raise ValueError('cannot set config on command line for %s()'
-                             % name)
-          for k, v in config.items():
-            cmdv.append('-c')
-            cmdv.append('%s=%s' % (k, v))
-        cmdv.append(name)
-        cmdv.extend(args)
-        p = GitCommand(self._project,
-                       cmdv,
-                       bare=self._bare,
-                       gitdir=self._gitdir,
-                       capture_stdout=True,
-                       capture_stderr=True)
-        if p.Wait() != 0:
-          raise GitError('%s %s: %s' %
-                         (self._project.name, name, p.stderr))
-        r = p.stdout
-        try:
-          r = r.decode('utf-8')
-        except AttributeError:
-          pass
-        if r.endswith('\n') and r.index('\n') == len(r) - 1:
-          return r[:-1]
-        return r
+        return self._spawn(name, *args, **kwargs)
       return runner
 
 
@@ -3112,10 +3290,12 @@ class MetaProject(Project):
     self.Sync_LocalHalf(syncbuf, submodules=submodules)
     syncbuf.Finish()
 
-    return GitCommand(self,
-                      ['update-ref', '-d', 'refs/heads/default'],
-                      capture_stdout=True,
-                      capture_stderr=True).Wait() == 0
+    ok = GitCommand(self,
+                    ['update-ref', '-d', 'refs/heads/default'],
+                    capture_stdout=True,
+                    capture_stderr=True).Wait() == 0
+    self._InvalidateRefs()
+    return ok
 
   @property
   def LastFetch(self):
@@ -3143,6 +3323,6 @@ class MetaProject(Project):
 
     if revid == head:
       return False
-    elif self._revlist(not_rev(HEAD), revid):
+    elif self._revlist('--max-count=1', not_rev(HEAD), revid):
       return True
     return False
@@ -13,6 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from __future__ import print_function
+import sys
+try:
+  import threading as _threading
+except ImportError:
+  import dummy_threading as _threading
+
 from command import PagedCommand
 from color import Coloring
 from error import NoSuchProjectError
@@ -25,7 +32,7 @@ class _Coloring(Coloring):
 class Info(PagedCommand):
   common = True
   helpSummary = "Get info on the manifest branch, current branch or unmerged branches"
-  helpUsage = "%prog [-dl] [-o [-b]] [<project>...]"
+  helpUsage = "%prog [-dl] [-j N] [-o [-b]] [<project>...]"
 
   def _Options(self, p):
     p.add_option('-d', '--diff',
@@ -40,6 +47,9 @@ class Info(PagedCommand):
     p.add_option('-l', '--local-only',
                  dest="local", action="store_true",
                  help="Disable all remote operations")
+    p.add_option('-j', '--jobs',
+                 dest='jobs', action='store', type='int', default=1,
+                 help="number of projects to fetch simultaneously with -d")
 
 
   def Execute(self, opt, args):
@@ -86,6 +96,11 @@ class Info(PagedCommand):
     except NoSuchProjectError:
       return
 
+    fetch = self.opt.all and not self.opt.local
+    if fetch and self.opt.jobs > 1:
+      self._FetchProjects(projs)
+      fetch = False
+
     for p in projs:
       self.heading("Project: ")
       self.headtext(p.name)
@@ -109,14 +124,71 @@ class Info(PagedCommand):
       self.out.nl()
 
       if self.opt.all:
-        self.findRemoteLocalDiff(p)
+        self.findRemoteLocalDiff(p, fetch)
 
       self.printSeparator()
 
-  def findRemoteLocalDiff(self, project):
+  def _FetchProject(self, project):
+    """Fetches the latest commits of |project|.
+
+    Returns:
+      None on success, otherwise the error message to report.
+    """
+    try:
+      if project.Sync_NetworkHalf(quiet=True, current_branch_only=True):
+        return None
+      return ('error: Cannot fetch %s from %s'
+              % (project.name, project.remote.url))
+    except Exception as e:
+      return ('error: Cannot fetch %s (%s: %s)'
+              % (project.name, type(e).__name__, str(e)))
+
+  def _FetchHelper(self, projects, sem, lock):
+    """Fetches |projects|, then releases |sem|.
+
+    Failures are reported (with |lock| held) and the other projects are
+    still fetched, as findRemoteLocalDiff does with --jobs=1.
+    """
+    try:
+      for project in projects:
+        error = self._FetchProject(project)
+        if error:
+          lock.acquire()
+          try:
+            print(error, file=sys.stderr)
+          finally:
+            lock.release()
+    finally:
+      sem.release()
+
+  def _FetchProjects(self, projects):
+    """Fetches |projects| using up to --jobs threads."""
+    # Projects sharing an object directory are fetched one after another by
+    # the same thread, as sync does, so they never write to it concurrently.
+    objdir_project_map = dict()
+    for project in projects:
+      objdir_project_map.setdefault(project.objdir, []).append(project)
+
+    lock = _threading.Lock()
+    sem = _threading.Semaphore(self.opt.jobs)
+    threads = []
+    for project_list in objdir_project_map.values():
+      sem.acquire()
+      t = _threading.Thread(target=self._FetchHelper,
+                            args=(project_list, sem, lock))
+      # Ensure that Ctrl-C will not freeze the repo process.
+      t.daemon = True
+      threads.append(t)
+      t.start()
+    for t in threads:
+      t.join()
+
+  def findRemoteLocalDiff(self, project, fetch=True):
     #Fetch all the latest commits
-    if not self.opt.local:
-      project.Sync_NetworkHalf(quiet=True, current_branch_only=True)
+    if fetch and not self.opt.local:
+      error = self._FetchProject(project)
+      if error:
+        print(error, file=sys.stderr)
 
     logTarget = R_M + self.manifest.manifestProject.config.GetBranch("default").merge
 
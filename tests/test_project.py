@@ -0,0 +1,71 @@
+import os
+import unittest
+
+import project
+
+def fixture(*paths):
+  """Return a path relative to test/fixtures.
+  """
+  return os.path.join(os.path.dirname(__file__), 'fixtures', *paths)
+
+class StatusPorcelainUnitTest(unittest.TestCase):
+  """Tests parsing of `git status --porcelain=v2 -z` output.
+  """
+  def setUp(self):
+    """Parse the status.porcelain2 fixture.
+    """
+    with open(fixture('status.porcelain2')) as fd:
+      self.out = fd.read()
+    self.di, self.df, self.do = project._ParseStatusPorcelain(self.out)
+
+  def test_ordinary_changes(self):
+    """
+    Index and work tree changes are split like diff-index/diff-files.
+    """
+    self.assertEqual(self.df['modified'].status, 'M')
+    self.assertNotIn('modified', self.di)
+    self.assertEqual(self.di['staged'].status, 'M')
+    self.assertEqual(self.di['staged'].new_id, 'b' * 40)
+    self.assertNotIn('staged', self.df)
+    self.assertEqual(self.di['added'].status, 'A')
+    self.assertEqual(self.di['added'].old_mode, '000000')
+    self.assertEqual(self.df['gone'].status, 'D')
+    self.assertEqual(self.df['gone'].new_mode, '000000')
+
+  def test_rename(self):
+    """
+    Renamed entries are keyed by the new path and carry the old one.
+    """
+    info = self.di['new name']
+    self.assertEqual(info.status, 'R')
+    self.assertEqual(info.level, '100')
+    self.assertEqual(info.src_path, 'old name')
+    self.assertNotIn('old name', self.di)
+
+  def test_conflicts(self):
+    """
+    Conflicts are U against HEAD; the work tree side depends on stage 2.
+    """
+    for path in ('both', 'theirs', 'ours'):
+      self.assertEqual(self.di[path].status, 'U')
+    self.assertEqual(self.di['both'].old_id, 'b' * 40)
+    self.assertEqual(self.df['both'].status, 'M')
+    self.assertEqual(self.df['theirs'].status, 'U')
+    self.assertEqual(self.df['ours'].status, 'D')
+
+  def test_untracked(self):
+    """
+    Untracked paths are listed unless they were not asked for.
+    """
+    self.assertEqual(self.do, ['sub/untracked file'])
+    _, _, do = project._ParseStatusPorcelain(self.out, untracked=False)
+    self.assertEqual(do, None)
+
+  def test_empty(self):
+    """
+    A clean work tree produces no entries.
+    """
+    self.assertEqual(project._ParseStatusPorcelain(''), ({}, {}, []))
+
+if __name__ == '__main__':
+  unittest.main()